@@ -1,26 +1,51 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, select
+import redis.asyncio as redis
+from app.db.redis import redis_client
 from app.db.session import get_db
 from app.db.models import User, Group, Message
+import logging
+import orjson
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_KEY = "stats:v1"
+STATS_CACHE_TTL_SECONDS = 60
 
 @router.get("/stats")
 async def get_stats(db: AsyncSession = Depends(get_db)):
     """
     Simple admin view for MVP.
+    Cached for a minute; the counts don't need to be live.
     """
-    user_count = await db.scalar(select(func.count(User.id)))
-    group_count = await db.scalar(select(func.count(Group.id)))
-    message_count = await db.scalar(select(func.count(Message.id)))
-    
+    try:
+        cached = await redis_client.get(STATS_CACHE_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Stats cache read failed: {e}")
+        cached = None
+    if cached is not None:
+        return orjson.loads(cached)
+
+    # All four counts in one round-trip
     # Calculate summons (approximate by messages where is_bot=True)
-    bot_msg_count = await db.scalar(select(func.count(Message.id)).where(Message.is_bot == True))
+    row = (await db.execute(select(
+        select(func.count(User.id)).scalar_subquery().label("users"),
+        select(func.count(Group.id)).scalar_subquery().label("groups"),
+        select(func.count(Message.id)).scalar_subquery().label("total_messages"),
+        select(func.count(Message.id)).where(Message.is_bot == True).scalar_subquery().label("jarvis_replies"),
+    ))).one()
 
-    return {
-        "users": user_count,
-        "groups": group_count,
-        "total_messages": message_count,
-        "jarvis_replies": bot_msg_count
+    stats = {
+        "users": row.users,
+        "groups": row.groups,
+        "total_messages": row.total_messages,
+        "jarvis_replies": row.jarvis_replies
     }
+
+    try:
+        await redis_client.set(STATS_CACHE_KEY, orjson.dumps(stats), ex=STATS_CACHE_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning(f"Stats cache write failed: {e}")
+    return stats
@@ -1,181 +1,291 @@
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Depends
+from fastapi import APIRouter, Request, HTTPException, Depends
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
+from sqlalchemy.dialects import postgresql, sqlite
 from app.services.telnyx_service import telnyx_service
 from app.services.summon_service import summon_service
 from app.services.llm_service import llm_service
+from app.services.message_batcher import MessageBatcher
+from app.core.config import settings
 from app.db.session import AsyncSessionLocal
 from app.db.models import User, Group, Message
+from typing import AsyncIterator
 import logging
+import orjson
+import re
 import uuid
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+SMS_SEGMENT_CHARS = 140
+SENTENCE_END = re.compile(r"[.!?]\s")
+
+# System prompts are fixed strings so every call shares a byte-identical prefix the
+# provider can prefix-cache; per-group context goes in the user message instead
+GROUP_REPLY_SYSTEM_PROMPT = (
+    "You are Jarvis in a group text. "
+    "The user message gives the group's context followed by the tagged request. "
+    "Respond only to the tagged request. Be concise and action-oriented. "
+    "End with a next step (one question max)."
+)
+
+DM_FALLBACK_SYSTEM_PROMPT = (
+    "You are Jarvis. The user tried to summon you in a group that is too large (>8 participants). "
+    "Explain that you can't reply to the group directly due to carrier limits. "
+    "Provide the answer to their request here in the DM, and suggest they paste it back to the group. "
+    "Keep it helpful and polite."
+)
+
+async def sms_segments(deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Regroups streamed LLM deltas into SMS-sized segments, cut at sentence ends
+    or at SMS_SEGMENT_CHARS, whichever comes first.
+    """
+    buffer = ""
+    async for delta in deltas:
+        buffer += delta
+        while True:
+            match = SENTENCE_END.search(buffer, 0, SMS_SEGMENT_CHARS + 1)
+            if match:
+                cut = match.end()
+            elif len(buffer) >= SMS_SEGMENT_CHARS:
+                # No sentence end in range; break at the last space that fits
+                space = buffer.rfind(" ", 0, SMS_SEGMENT_CHARS)
+                cut = space + 1 if space > 0 else SMS_SEGMENT_CHARS
+            else:
+                break
+            segment, buffer = buffer[:cut].strip(), buffer[cut:]
+            if segment:
+                yield segment
+
+    if buffer.strip():
+        yield buffer.strip()
+
+def upsert(db: AsyncSession, model):
+    """
+    INSERT that supports ON CONFLICT for the session's dialect (Postgres, or SQLite in tests).
+    """
+    dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+    return dialect.insert(model)
+
 async def get_db_session():
     async with AsyncSessionLocal() as session:
         yield session
 
 @router.post("/webhook")
-async def telnyx_webhook(request: Request, background_tasks: BackgroundTasks):
+async def telnyx_webhook(request: Request):
     """
     Receives inbound webhooks from Telnyx.
     """
+    # orjson decodes large payloads (long 'to' lists, media fields) several times faster than stdlib json
     try:
-        payload = await request.json()
-    except Exception:
+        payload = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
     event_type = payload.get("data", {}).get("event_type")
     
     if event_type == "message.received":
-        background_tasks.add_task(process_inbound_message, payload)
+        sender_num, _, participant_nums = parse_inbound_message(payload)
+        if sender_num is None:
+            # Nothing to reply to; acknowledge so Telnyx doesn't keep redelivering it
+            logger.warning("Ignoring message.received without a sender number")
+            return {"status": "ignored"}
+
+        # Active groups often deliver several events a second; coalesce them per group
+        await inbound_batcher.submit(Group.hash_participants(participant_nums), payload)
     
     return {"status": "received"}
 
-async def process_inbound_message(payload: dict):
+def parse_inbound_message(payload: dict) -> tuple[str, str, list[str]]:
     """
-    Core logic to handle the inbound message.
+    Extracts (sender, text, participants) from a message.received payload.
     """
-    data = payload.get("data", {}).get("payload", {})
-    sender_num = data.get("from", {}).get("phone_number")
-    text = data.get("text", "")
-    to_list = data.get("to", [])
+    data = payload.get("data", {}).get("payload") or {}
+    sender_num = (data.get("from") or {}).get("phone_number")
+    text = data.get("text") or ""
+    to_list = data.get("to") or []
     
     # Normalize participants
     # 'to_list' contains all recipients including the bot if it's a group message
     # We need to extract all phone numbers to form the group signature
-    participant_nums = sorted([p.get("phone_number") for p in to_list] + [sender_num])
-    participant_nums = list(set(participant_nums)) # Deduplicate
-
-    # Compliance Keywords
-    keyword = text.strip().upper()
-    if keyword == "STOP":
-        # Telnyx handles opt-out automatically usually, but we should acknowledge or cleanup
-        # For MVP, just return
-        return {"status": "opt-out-processed"}
-    elif keyword == "START":
-        # Opt-in
-        return {"status": "opt-in-processed"}
-    elif keyword == "HELP":
-        # Send help message
-        await telnyx_service.send_direct_message(
-            to_number=sender_num,
-            text="Jarvis Help: Mention @jarvis in a group to get planning help. I only reply when summoned."
-        )
-        return {"status": "help-sent"}
+    # One pass: the set deduplicates, and the sort gives a stable order to store and hash.
+    # Entries without a number are dropped; None can't be sorted against strings.
+    participant_nums = sorted({sender_num, *(p.get("phone_number") for p in to_list)} - {None})
+    return sender_num, text, participant_nums
+
+async def process_inbound_message(payload: dict):
+    """
+    Core logic to handle the inbound message.
+    """
+    await process_inbound_batch([payload])
+
+async def send_help_replies(sender_nums: list[str]):
+    """
+    Answers HELP keywords. A failed send is logged and never takes the batch down with it.
+    """
+    for sender_num in sender_nums:
+        try:
+            await telnyx_service.send_direct_message(
+                to_number=sender_num,
+                text="Jarvis Help: Mention @jarvis in a group to get planning help. I only reply when summoned."
+            )
+        except Exception:
+            logger.exception(f"Failed to send HELP reply to {sender_num}")
+
+async def process_inbound_batch(payloads: list[dict]):
+    """
+    Handles a burst of inbound messages for one group: persists them together and
+    answers only the latest summon.
+    """
+    # Batches are keyed by group, so every payload shares the participant set
+    _, _, participant_nums = parse_inbound_message(payloads[0])
+
+    inbound = []
+    help_senders = []
+    for payload in payloads:
+        sender_num, text, _ = parse_inbound_message(payload)
+
+        # Compliance Keywords
+        keyword = text.strip().upper()
+        if keyword == "STOP":
+            # Telnyx handles opt-out automatically usually, but we should acknowledge or cleanup
+            # For MVP, just skip
+            continue
+        elif keyword == "START":
+            # Opt-in
+            continue
+        elif keyword == "HELP":
+            # Replied to once the batch is persisted, so a failed send can't lose it
+            help_senders.append(sender_num)
+            continue
+
+        inbound.append((sender_num, text))
+
+    if not inbound:
+        await send_help_replies(help_senders)
+        return
 
     # Create a new DB session for this background task
     async with AsyncSessionLocal() as db:
-        # 1. Persist/Update User (Sender)
-        result = await db.execute(select(User).where(User.phone_number == sender_num))
-        user = result.scalars().first()
-        if not user:
-            user = User(phone_number=sender_num)
-            db.add(user)
-            await db.commit()
-            await db.refresh(user)
+        # 1. Persist/Update Users (Senders)
+        # Upsert in one round-trip; also safe when two webhooks race on a new sender.
+        # Deduplicated since ON CONFLICT can't touch the same row twice in one statement.
+        senders = sorted({sender_num for sender_num, _ in inbound})
+        stmt = upsert(db, User).values([{"phone_number": num} for num in senders])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.phone_number],
+            set_={"phone_number": stmt.excluded.phone_number},
+        ).returning(User.phone_number, User.id)
+        # Only the ids are needed, so skip ORM entity loading altogether
+        user_ids = dict((await db.execute(stmt)).all())
 
         # 2. Persist/Update Group
-        # For MVP, we identify groups by the sorted list of participants
-        # In reality, Telnyx might provide a group_id, but let's stick to participant hash for now if needed,
-        # or just check if a group exists with these exact participants.
-        # Postgres ARRAY comparison can be tricky, so let's try to find a match.
-        # For simplicity in MVP, we might just assume if it's a group MMS, we treat it as a group.
+        # For MVP, we identify groups by the set of participants
+        # In reality, Telnyx might provide a group_id, but let's stick to participant hash for now.
+        # The hash is a unique B-tree key, so lookup is a single index hit instead of
+        # comparing JSON participant lists across the whole table.
         
         # Check if it's a group message (more than 2 participants usually, or explicit group type)
         # Telnyx payload might have 'type': 'MMS' or similar.
         # Let's assume > 2 participants = Group, or if we want to support 1:1 DM as a "Group of 2".
-        
-        # Let's try to find a group with these exact participants
-        # This is a naive search, might need optimization later.
-        result = await db.execute(select(Group).filter(Group.participants == participant_nums))
-        group = result.scalars().first()
-        
-        if not group:
-            group = Group(participants=participant_nums)
-            db.add(group)
-            await db.commit()
-            await db.refresh(group)
-
-        # 3. Log Message
-        message = Message(
-            group_id=group.id,
-            sender_id=user.id,
-            content=text,
-            is_bot=False
+        stmt = upsert(db, Group).values(
+            participants=participant_nums,
+            participants_hash=Group.hash_participants(participant_nums),
         )
-        db.add(message)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Group.participants_hash],
+            set_={"last_active": stmt.excluded.last_active},
+        ).returning(Group.id, Group.summary)
+        group_id, group_summary = (await db.execute(stmt)).one()
+
+        # 3. Log Messages
+        # One multi-row INSERT for the whole batch
+        await db.execute(insert(Message), [
+            {
+                "group_id": group_id,
+                "sender_id": user_ids[sender_num],
+                "content": text,
+                "is_bot": False,
+            }
+            for sender_num, text in inbound
+        ])
+
+        # Users, group and messages go out in a single transaction
         await db.commit()
+        await send_help_replies(help_senders)
 
         # 4. Summon Check
-        if summon_service.is_summon(text):
-            logger.info(f"Summon detected from {sender_num} in group {group.id}")
+        # Only the latest summon in the batch gets a reply; earlier ones are superseded
+        summon = next(((num, text) for num, text in reversed(inbound) if summon_service.is_summon(text)), None)
+        if summon:
+            sender_num, text = summon
+            user_id = user_ids[sender_num]
+            logger.info(f"Summon detected from {sender_num} in group {group_id}")
             
             # Rate Limit Checks
             from app.services.rate_limiter import rate_limiter
             
-            if not await rate_limiter.check_user_limit(str(user.id)):
-                logger.warning(f"User {user.id} hit rate limit")
+            # Both limits in a single Redis round-trip
+            user_allowed, group_allowed = await rate_limiter.check_both(str(user_id), str(group_id))
+
+            if not user_allowed:
+                logger.warning(f"User {user_id} hit rate limit")
                 # Optionally send a "too many requests" DM
                 return {"status": "rate_limited"}
 
-            if not await rate_limiter.check_group_limit(str(group.id)):
-                logger.warning(f"Group {group.id} hit rate limit")
+            if not group_allowed:
+                logger.warning(f"Group {group_id} hit rate limit")
                 # Optionally send a "cooling down" message to group
                 return {"status": "rate_limited"}
             
             # 5. Routing Logic
             if len(participant_nums) <= 8:
                 # Group Reply
-                group_summary = group.summary or "No previous context."
-                system_prompt = (
-                    f"You are Jarvis in a group text. "
-                    f"Context: {group_summary} "
-                    f"Respond only to the tagged request. Be concise and action-oriented. "
-                    f"End with a next step (one question max)."
+                context = group_summary or "No previous context."
+                user_prompt = f"Context: {context}\n\nRequest: {text}"
+                # Match near-duplicates on the request alone, and only within this group so
+                # replies never leak across groups. The rolling summary is left out of the
+                # scope: it changes after every reply and would make hits all but impossible.
+                response_text = await llm_service.generate_response(
+                    GROUP_REPLY_SYSTEM_PROMPT,
+                    user_prompt,
+                    semantic_query=text,
+                    semantic_scope=str(group_id),
                 )
-                response_text = await llm_service.generate_response(system_prompt, text)
                 
                 await telnyx_service.send_group_message(
-                    group_id=str(group.id),
+                    group_id=str(group_id),
                     text=response_text,
                     to_numbers=participant_nums
                 )
                 
                 # Log Bot Response
-                bot_msg = Message(
-                    group_id=group.id,
+                await db.execute(insert(Message).values(
+                    group_id=group_id,
                     sender_id=None, # Bot
                     content=response_text,
                     is_bot=True
-                )
-                db.add(bot_msg)
+                ))
                 await db.commit()
                 
                 # Trigger Summarization (Fire and Forget)
                 # We pass the recent context or just the new interaction
-                # For MVP, let's just summarize the last few messages including this one
-                # ideally this should be a separate background task to not block
-                # But since we are already in a background task, we can do it here or spawn another.
-                # Let's spawn another to keep response fast if we were not already async.
-                # Since we are awaiting LLM above, we are already "slow".
-                
-                # Let's just do it here for simplicity of state
+                # The summary is another full LLM round-trip, so it runs in the background
+                # with its own DB session instead of holding up this handler
                 from app.services.summarization_service import summarization_service
-                await summarization_service.update_group_summary(db, group, [f"{sender_num}: {text}", f"Jarvis: {response_text}"])
+                summarization_service.schedule_group_summary(group_id, [f"{sender_num}: {text}", f"Jarvis: {response_text}"])
                 
             else:
                 # DM Fallback
-                system_prompt = (
-                    "You are Jarvis. The user tried to summon you in a group that is too large (>8 participants). "
-                    "Explain that you can't reply to the group directly due to carrier limits. "
-                    "Provide the answer to their request here in the DM, and suggest they paste it back to the group. "
-                    "Keep it helpful and polite."
-                )
-                response_text = await llm_service.generate_response(system_prompt, text)
-                
-                await telnyx_service.send_direct_message(
-                    to_number=sender_num,
-                    text=response_text
-                )
+                # Stream the reply and send each SMS segment as soon as it is complete,
+                # so the user hears back at the first sentence rather than the last token
+                deltas = llm_service.generate_stream(DM_FALLBACK_SYSTEM_PROMPT, text)
+                async for segment in sms_segments(deltas):
+                    await telnyx_service.send_direct_message(
+                        to_number=sender_num,
+                        text=segment
+                    )
+
+inbound_batcher = MessageBatcher(process_inbound_batch, settings.WEBHOOK_BATCH_WINDOW_SECONDS)
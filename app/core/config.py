@@ -8,6 +8,9 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
     
     REDIS_HOST: str
     REDIS_PORT: int
@@ -18,6 +21,12 @@ class Settings(BaseSettings):
     
     OPENAI_API_KEY: str | None = None
 
+    WEBHOOK_BATCH_WINDOW_SECONDS: float = 0.2
+    LLM_CACHE_TTL_SECONDS: int = 86400
+    LLM_SEMANTIC_CACHE_ENABLED: bool = True
+    LLM_SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    LLM_SEMANTIC_CACHE_MAX_ENTRIES: int = 10000
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,6 +1,7 @@
+import hashlib
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean, JSON, ARRAY
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean, JSON, ARRAY, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -21,11 +22,25 @@ class Group(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     telnyx_group_id = Column(String, unique=True, index=True, nullable=True)
     participants = Column(JSON, default=[])
+    participants_hash = Column(String(64), unique=True, index=True, nullable=True)
     summary = Column(Text, nullable=True)
     last_active = Column(DateTime, default=datetime.utcnow)
 
+    @staticmethod
+    def hash_participants(participants: list[str]) -> str:
+        """
+        Order-independent signature of a participant set, used to look groups up by index.
+        """
+        return hashlib.sha256(",".join(sorted(participants)).encode()).hexdigest()
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Partial index over bot replies only, so counting them is an index-only scan
+        Index("ix_messages_bot", "id", postgresql_where=text("is_bot")),
+        # Per-group history in time order
+        Index("ix_messages_group_id_timestamp", "group_id", "timestamp"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id"), nullable=True)
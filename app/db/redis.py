@@ -0,0 +1,5 @@
+import redis.asyncio as redis
+from app.core.config import settings
+
+# One connection pool per process, shared by the rate limiter, LLM cache and admin views
+redis_client = redis.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}", encoding="utf-8", decode_responses=True)
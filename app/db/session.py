@@ -1,13 +1,39 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+import asyncio
+import logging
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+logger = logging.getLogger(__name__)
+
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+async def warm_pool():
+    """
+    Opens the whole pool up front so the first webhooks don't pay for connect + auth.
+    """
+    connections = await asyncio.gather(
+        *[engine.connect() for _ in range(settings.DB_POOL_SIZE)], return_exceptions=True
+    )
+    opened = [conn for conn in connections if not isinstance(conn, BaseException)]
+    # Closing returns the connections to the pool rather than disconnecting them
+    await asyncio.gather(*[conn.close() for conn in opened])
+
+    if len(opened) < len(connections):
+        errors = [conn for conn in connections if isinstance(conn, BaseException)]
+        logger.warning(f"DB pool warm-up opened {len(opened)}/{len(connections)} connections: {errors[0]}")
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
@@ -1,9 +1,27 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.core.config import settings
-from app.api.v1.endpoints import router as api_router
+from app.api.v1.endpoints import router as api_router, inbound_batcher
 from app.api.v1.admin import router as admin_router
+from app.db.redis import redis_client
+from app.db.session import warm_pool
+from app.services.llm_service import llm_service
+from app.services.summarization_service import summarization_service
+from app.services.telnyx_service import telnyx_service
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_pool()
+    yield
+    # Let buffered webhooks finish before their outbound clients go away, then the
+    # summary jobs those final batches scheduled, which still need the LLM client
+    await inbound_batcher.drain()
+    await summarization_service.drain()
+    await telnyx_service.close()
+    await llm_service.close()
+    await redis_client.aclose()
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 app.include_router(api_router, prefix="/api/v1")
 app.include_router(admin_router, prefix="/api/v1/admin")
@@ -1,25 +1,174 @@
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, APIConnectionError, RateLimitError, InternalServerError
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
+import asyncio
+from typing import AsyncIterator
+import redis.asyncio as redis
 from app.core.config import settings
+from app.db.redis import redis_client
+from app.services.semantic_cache import SemanticCache
+import hashlib
+import httpx
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Provider flaps worth retrying: network errors/timeouts, 429s and 5xx. Anything else
+# (bad request, auth) fails the same way on every attempt.
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
 
 class LLMService:
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        # Tuned pool over HTTP/2 so concurrent summons multiplex over warm connections
+        self.http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=30.0,
+        )
+        # Retries are handled by _create_completion, so the SDK's own are turned off
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=self.http_client, max_retries=0)
         self.model = "gpt-4o" # Or appropriate model
+        # Summaries are bookkeeping, not user-facing, so a smaller model is enough
+        self.summary_model = "gpt-4o-mini"
+        self.redis = redis_client
+        self.semantic_cache = SemanticCache(self.redis)
+        # Completions currently being generated, keyed like the Redis cache
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def cache_key(model: str, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float) -> str:
+        """
+        Deterministic key for a completion request.
+        """
+        raw = json.dumps([model, system_prompt, user_prompt, max_tokens, temperature], sort_keys=True)
+        return "llm:" + hashlib.sha256(raw.encode()).hexdigest()
+
+    async def generate_response(self, system_prompt: str, user_prompt: str, max_tokens: int = 300, temperature: float = 0.7, semantic_query: str | None = None, semantic_scope: str = "") -> str:
+        """
+        semantic_query is the text near-duplicates are matched on (defaults to user_prompt);
+        semantic_scope limits where a cached reply may be reused (e.g. one group), on top
+        of only ever reusing it under the same system prompt.
+        """
+        semantic = (semantic_query or user_prompt, system_prompt + "\0" + semantic_scope)
+        try:
+            return await self._complete(self.model, system_prompt, user_prompt, max_tokens, temperature, semantic)
+        except Exception:
+            logger.exception(f"LLM request failed (model={self.model})")
+            return "I'm having trouble thinking right now."
+
+    async def generate_summary(self, system_prompt: str, user_prompt: str, max_tokens: int = 200, temperature: float = 0) -> str:
+        """
+        Completion for rolling summaries: deterministic so repeats hit the exact cache,
+        and kept out of the semantic cache since near-duplicate inputs need distinct summaries.
+        Raises on failure rather than returning a canned reply, so callers keep the old summary.
+        """
+        return await self._complete(self.summary_model, system_prompt, user_prompt, max_tokens, temperature, semantic=None)
+
+    async def _complete(self, model: str, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float, semantic: tuple[str, str] | None) -> str:
+        key = self.cache_key(model, system_prompt, user_prompt, max_tokens, temperature)
+
+        # Single-flight: concurrent identical prompts share one generation. The shared
+        # work runs as its own task so a cancelled caller doesn't cancel the others.
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._generate(key, model, system_prompt, user_prompt, max_tokens, temperature, semantic))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(inflight)
+
+    async def _generate(self, key: str, model: str, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float, semantic: tuple[str, str] | None) -> str:
+        cached = await self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        # semantic is (query, scope), or None to skip the semantic layer
+        embedding = None
+        if semantic is not None and self.semantic_cache.enabled:
+            query, scope = semantic
+            embedding = await self.semantic_cache.embed(query)
+            cached = await self.semantic_cache.lookup(scope, embedding)
+            if cached is not None:
+                return cached
 
-    async def generate_response(self, system_prompt: str, user_prompt: str) -> str:
+        # Failures propagate to every waiter; each caller decides what to fall back to
+        response = await self._create_completion(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=max_tokens, # Keep it short for SMS
+            temperature=temperature,
+        )
+        content = response.choices[0].message.content.strip()
+
+        await self._cache_set(key, content)
+        if embedding is not None:
+            await self.semantic_cache.store(scope, query, embedding, content)
+        return content
+
+    async def generate_stream(self, system_prompt: str, user_prompt: str, max_tokens: int = 300, temperature: float = 0.7) -> AsyncIterator[str]:
+        """
+        Yields the reply as it is generated so callers can start sending before the last token.
+        The full reply is still written to the exact cache once the stream completes.
+        """
+        key = self.cache_key(self.model, system_prompt, user_prompt, max_tokens, temperature)
+        cached = await self._cache_get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
         try:
-            response = await self.client.chat.completions.create(
+            stream = await self._create_completion(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                max_tokens=300, # Keep it short for SMS
-                temperature=0.7,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
             )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"LLM Error: {e}")
-            return "I'm having trouble thinking right now."
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+        except Exception:
+            logger.exception(f"LLM stream failed (model={self.model})")
+            # Anything already yielded has been acted on; only fill silence
+            if not parts:
+                yield "I'm having trouble thinking right now."
+            return
+
+        await self._cache_set(key, "".join(parts).strip())
+
+    @retry(
+        wait=wait_random_exponential(max=8),
+        stop=stop_after_attempt(3),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        reraise=True,
+    )
+    async def _create_completion(self, **kwargs):
+        # Jittered backoff absorbs provider flaps here, instead of failing the
+        # webhook and having Telnyx redeliver it
+        return await self.client.chat.completions.create(**kwargs)
+
+    async def _cache_get(self, key: str) -> str | None:
+        # A cache outage should only cost us the round-trip, never the reply
+        try:
+            return await self.redis.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+
+    async def _cache_set(self, key: str, content: str):
+        try:
+            await self.redis.set(key, content, ex=settings.LLM_CACHE_TTL_SECONDS)
+        except redis.RedisError as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    async def close(self):
+        await self.client.close()
 
 llm_service = LLMService()
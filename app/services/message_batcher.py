@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+class MessageBatcher:
+    """
+    Coalesces events that share a key (e.g. a group) and hands them to the handler
+    as one batch, window_seconds after the first event of the batch arrived.
+    """
+    def __init__(self, handler: Callable[[list[dict]], Awaitable], window_seconds: float):
+        self.handler = handler
+        self.window_seconds = window_seconds
+        self._batches: defaultdict[str, list[dict]] = defaultdict(list)
+        # Keep references to pending flushes so they aren't garbage collected
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, key: str, payload: dict):
+        # No await between reading and appending, so this can't interleave with a flush
+        batch = self._batches[key]
+        batch.append(payload)
+        if len(batch) == 1:
+            task = asyncio.create_task(self._flush_after(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush_after(self, key: str):
+        await asyncio.sleep(self.window_seconds)
+        batch = self._batches.pop(key)
+        try:
+            await self.handler(batch)
+        except Exception:
+            logger.exception(f"Failed to process batch of {len(batch)} events for {key}")
+
+    async def drain(self):
+        """
+        Waits for every pending batch to be processed, e.g. on shutdown.
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -1,10 +1,41 @@
-import redis.asyncio as redis
-from app.core.config import settings
+from app.db.redis import redis_client
 import time
+import uuid
+
+# Sliding window over a sorted set of admitted request timestamps. Every key is trimmed
+# and checked first; the request is recorded against all keys only if every limit
+# allows it, so a rejected request never spends budget on another key (e.g. a user
+# over their daily limit doesn't eat into the group's hourly one). Rejected requests
+# aren't recorded at all, so demand above the limit can't keep a key locked out.
+# ARGV is now, member, then a (limit, window) pair per key; returns a 1/0 flag per key.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local allowed = {}
+local admit = true
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[2 * i + 1])
+    local window = tonumber(ARGV[2 * i + 2])
+    redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+    if redis.call('ZCARD', key) < limit then
+        allowed[i] = 1
+    else
+        allowed[i] = 0
+        admit = false
+    end
+end
+if admit then
+    for i, key in ipairs(KEYS) do
+        redis.call('ZADD', key, now, ARGV[2])
+        redis.call('EXPIRE', key, tonumber(ARGV[2 * i + 2]))
+    end
+end
+return allowed
+"""
 
 class RateLimiter:
     def __init__(self):
-        self.redis = redis.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}", encoding="utf-8", decode_responses=True)
+        self.redis = redis_client
+        self._sliding_window = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
         
         # Limits
         self.GROUP_LIMIT_PER_HOUR = 10
@@ -12,17 +43,24 @@ class RateLimiter:
 
     async def is_allowed(self, key: str, limit: int, window_seconds: int) -> bool:
         """
-        Generic sliding window or fixed window rate limiter.
-        Using simple fixed window for MVP.
+        Sliding window rate limiter.
+        Unlike a fixed window, this doesn't allow a 2x burst across a window boundary.
         """
-        current_window = int(time.time() / window_seconds)
-        redis_key = f"rate_limit:{key}:{current_window}"
-        
-        current_count = await self.redis.incr(redis_key)
-        if current_count == 1:
-            await self.redis.expire(redis_key, window_seconds)
-            
-        return current_count <= limit
+        (allowed,) = await self._check({f"rate_limit:{key}": (limit, window_seconds)})
+        return allowed
+
+    async def _check(self, limits: dict[str, tuple[int, int]]) -> list[bool]:
+        """
+        Checks each key against its (limit, window in seconds), recording the request
+        against all of them only if all allow it, and returns the per-key allowed flags.
+        """
+        # Unique member so simultaneous requests don't collapse into one entry
+        member = uuid.uuid4().hex
+        args = [time.time(), member]
+        for limit, window_seconds in limits.values():
+            args += [limit, window_seconds]
+        flags = await self._sliding_window(keys=list(limits), args=args)
+        return [bool(flag) for flag in flags]
 
     async def check_group_limit(self, group_id: str) -> bool:
         return await self.is_allowed(f"group:{group_id}", self.GROUP_LIMIT_PER_HOUR, 3600)
@@ -30,4 +68,15 @@ class RateLimiter:
     async def check_user_limit(self, user_id: str) -> bool:
         return await self.is_allowed(f"user:{user_id}", self.USER_LIMIT_PER_DAY, 86400)
 
+    async def check_both(self, user_id: str, group_id: str) -> tuple[bool, bool]:
+        """
+        Checks the user and group limits together in a single Redis round-trip.
+        A request denied by either limit counts against neither.
+        """
+        user_allowed, group_allowed = await self._check({
+            f"rate_limit:user:{user_id}": (self.USER_LIMIT_PER_DAY, 86400),
+            f"rate_limit:group:{group_id}": (self.GROUP_LIMIT_PER_HOUR, 3600),
+        })
+        return user_allowed, group_allowed
+
 rate_limiter = RateLimiter()
@@ -0,0 +1,115 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import redis.asyncio as redis
+from app.core.config import settings
+
+try:
+    import faiss
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    # Optional heavy deps; without them the semantic layer is simply disabled
+    faiss = None
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+class SemanticCache:
+    """
+    Reuses LLM responses for near-duplicate prompts (e.g. "@jarvis plan dinner" vs
+    "jarvis help plan dinner"). Embeddings live in in-process FAISS inner-product
+    indexes; responses live in Redis so they expire with the regular cache TTL.
+
+    Only the request text is embedded. Everything else that shapes the answer (system
+    prompt, group) goes into the scope, and each scope gets its own index, so a closer
+    entry from another scope can never hide a hit and a reply never crosses scopes.
+    """
+    def __init__(self, redis_client: redis.Redis):
+        self.redis = redis_client
+        self.threshold = settings.LLM_SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = settings.LLM_SEMANTIC_CACHE_MAX_ENTRIES
+        self.enabled = settings.LLM_SEMANTIC_CACHE_ENABLED and SentenceTransformer is not None
+
+        self.model = None
+        self.index_factory = None
+        # Scope hash -> (index, rows parallel to it as (embedding, redis key of the response))
+        self.scopes: dict[str, tuple[object, list[tuple[object, str]]]] = {}
+        self.size = 0
+
+        if self.enabled:
+            self.model = SentenceTransformer(EMBEDDING_MODEL)
+            self.index_factory = functools.partial(faiss.IndexFlatIP, EMBEDDING_DIM)
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    async def embed(self, query: str):
+        # Normalized vectors make inner product equal to cosine similarity
+        return await asyncio.to_thread(self.model.encode, [query], normalize_embeddings=True)
+
+    async def lookup(self, scope: str, embedding) -> str | None:
+        scope_hash = self._hash(scope)
+        while scope_hash in self.scopes:
+            index, rows = self.scopes[scope_hash]
+            scores, ids = index.search(embedding, 1)
+            score, idx = float(scores[0][0]), int(ids[0][0])
+            if idx < 0 or score < self.threshold:
+                return None
+
+            response_key = rows[idx][1]
+            try:
+                response = await self.redis.get(response_key)
+            except redis.RedisError as e:
+                logger.warning(f"Semantic cache read failed: {e}")
+                return None
+            if response is not None:
+                return response
+
+            # Expired in Redis: drop it so it stops shadowing the next-best entry
+            self._forget(scope_hash, response_key)
+        return None
+
+    async def store(self, scope: str, query: str, embedding, response: str):
+        response_key = "llm:semantic:" + self._hash(scope + "\0" + query)
+        try:
+            await self.redis.set(response_key, response, ex=settings.LLM_CACHE_TTL_SECONDS)
+        except redis.RedisError as e:
+            logger.warning(f"Semantic cache write failed: {e}")
+            return
+
+        scope_hash = self._hash(scope)
+        if scope_hash in self.scopes and any(key == response_key for _, key in self.scopes[scope_hash][1]):
+            # Same request again: the write above refreshed it, the vector is already indexed
+            return
+
+        # Flat indexes: start over rather than let the linear scans grow unbounded
+        if self.size >= self.max_entries:
+            self.scopes.clear()
+            self.size = 0
+
+        index, rows = self.scopes.setdefault(scope_hash, (self.index_factory(), []))
+        index.add(embedding)
+        rows.append((embedding, response_key))
+        self.size += 1
+
+    def _forget(self, scope_hash: str, response_key: str):
+        # Another lookup may already have removed it while we awaited Redis
+        entry = self.scopes.get(scope_hash)
+        if entry is None:
+            return
+        rows = [row for row in entry[1] if row[1] != response_key]
+        self.size -= len(entry[1]) - len(rows)
+        if not rows:
+            del self.scopes[scope_hash]
+            return
+
+        # Rebuild rather than remove in place, so row positions keep matching index ids
+        index = self.index_factory()
+        for embedding, _ in rows:
+            index.add(embedding)
+        self.scopes[scope_hash] = (index, rows)
@@ -1,28 +1,70 @@
 from app.services.llm_service import llm_service
 from app.db.models import Group, User
+from app.db.session import AsyncSessionLocal
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
+GROUP_SUMMARY_SYSTEM_PROMPT = (
+    "You are a helpful assistant that summarizes group chat history for a planning bot named Jarvis. "
+    "Update the current summary with the new messages. "
+    "Focus on decisions made, constraints mentioned (time, location, budget), and pending questions. "
+    "Keep it concise (under 150 words)."
+)
+
+USER_PROFILE_SYSTEM_PROMPT = (
+    "You are a helpful assistant. Extract user preferences and traits from their messages. "
+    "Update the user profile summary. Focus on dietary restrictions, location preferences, and communication style. "
+    "Keep it concise."
+)
+
 class SummarizationService:
+    def __init__(self):
+        # Keep references to background jobs so they aren't garbage collected mid-run
+        self._tasks: set[asyncio.Task] = set()
+
+    def schedule_group_summary(self, group_id: uuid.UUID, new_messages: list[str]) -> asyncio.Task:
+        """
+        Updates the group summary in the background so the caller doesn't wait on the LLM.
+        """
+        task = asyncio.create_task(self._group_summary_job(group_id, new_messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def drain(self):
+        """
+        Waits for every scheduled summary job to finish, e.g. on shutdown.
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _group_summary_job(self, group_id: uuid.UUID, new_messages: list[str]):
+        # Runs after the webhook's session is gone, so it opens its own
+        try:
+            async with AsyncSessionLocal() as db:
+                group = await db.get(Group, group_id)
+                if group is None:
+                    logger.warning(f"Group {group_id} vanished before its summary update")
+                    return
+                await self.update_group_summary(db, group, new_messages)
+        except Exception:
+            logger.exception(f"Failed to update summary for group {group_id}")
+
     async def update_group_summary(self, db: AsyncSession, group: Group, new_messages: list[str]):
         """
         Updates the rolling summary for a group based on new messages.
+        If the LLM call fails the error propagates and the previous summary is kept.
         """
         current_summary = group.summary or "No summary yet."
         messages_text = "\n".join(new_messages)
         
-        system_prompt = (
-            "You are a helpful assistant that summarizes group chat history for a planning bot named Jarvis. "
-            "Update the current summary with the new messages. "
-            "Focus on decisions made, constraints mentioned (time, location, budget), and pending questions. "
-            "Keep it concise (under 200 words)."
-        )
-        
         user_prompt = f"Current Summary:\n{current_summary}\n\nNew Messages:\n{messages_text}\n\nUpdated Summary:"
         
-        new_summary = await llm_service.generate_response(system_prompt, user_prompt)
+        new_summary = await llm_service.generate_summary(GROUP_SUMMARY_SYSTEM_PROMPT, user_prompt)
         
         group.summary = new_summary
         db.add(group)
@@ -32,20 +74,15 @@ class SummarizationService:
     async def update_user_summary(self, db: AsyncSession, user: User, new_messages: list[str]):
         """
         Updates the rolling summary for a user (preferences, tone).
+        If the LLM call fails the error propagates and the previous preferences are kept.
         """
         current_preferences = user.preferences or {}
         current_summary = current_preferences.get("summary", "No details yet.")
         messages_text = "\n".join(new_messages)
         
-        system_prompt = (
-            "You are a helpful assistant. Extract user preferences and traits from their messages. "
-            "Update the user profile summary. Focus on dietary restrictions, location preferences, and communication style. "
-            "Keep it concise."
-        )
-        
         user_prompt = f"Current Profile:\n{current_summary}\n\nNew Messages:\n{messages_text}\n\nUpdated Profile:"
         
-        new_summary = await llm_service.generate_response(system_prompt, user_prompt)
+        new_summary = await llm_service.generate_summary(USER_PROFILE_SYSTEM_PROMPT, user_prompt)
         
         # Update preferences JSON
         current_preferences["summary"] = new_summary
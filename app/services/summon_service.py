@@ -5,10 +5,12 @@ class SummonService:
         # Regex to match "jarvis" or "@jarvis" at word boundaries
         # Case insensitive
         self.summon_pattern = re.compile(r'(^|\s)@?jarvis(:|\s|$)', re.IGNORECASE)
+        # Bound once; this runs on every inbound message
+        self._search = self.summon_pattern.search
 
     def is_summon(self, text: str) -> bool:
-        if not text:
-            return False
-        return bool(self.summon_pattern.search(text))
+        # Most messages never mention jarvis; a substring check rejects them
+        # without running the regex at all
+        return bool(text) and "jarvis" in text.lower() and self._search(text) is not None
 
 summon_service = SummonService()
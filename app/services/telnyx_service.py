@@ -2,7 +2,8 @@ import httpx
 from app.core.config import settings
 from typing import List
 
-TELNYX_MESSAGING_URL = "https://api.telnyx.com/v2/messages"
+TELNYX_API_BASE_URL = "https://api.telnyx.com"
+TELNYX_MESSAGING_PATH = "/v2/messages"
 
 class TelnyxService:
     def __init__(self):
@@ -11,6 +12,15 @@ class TelnyxService:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        # One pooled client for the process so outbound messages reuse warm
+        # TLS connections instead of handshaking on every send
+        self.client = httpx.AsyncClient(
+            base_url=TELNYX_API_BASE_URL,
+            headers=self.headers,
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=10.0,
+        )
 
     async def send_group_message(self, group_id: str, text: str, to_numbers: List[str]):
         """
@@ -37,10 +47,9 @@ class TelnyxService:
             "subject": "Jarvis Group Chat" # Optional, helps some carriers treat as group
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(TELNYX_MESSAGING_URL, json=payload, headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+        response = await self.client.post(TELNYX_MESSAGING_PATH, json=payload)
+        response.raise_for_status()
+        return response.json()
 
     async def send_direct_message(self, to_number: str, text: str):
         """
@@ -52,9 +61,11 @@ class TelnyxService:
             "text": text
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(TELNYX_MESSAGING_URL, json=payload, headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+        response = await self.client.post(TELNYX_MESSAGING_PATH, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self):
+        await self.client.aclose()
 
 telnyx_service = TelnyxService()
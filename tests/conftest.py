@@ -0,0 +1,5 @@
+import os
+
+# Keep the test run from loading the embedding model, even where
+# sentence-transformers and faiss are installed
+os.environ.setdefault("LLM_SEMANTIC_CACHE_ENABLED", "false")
@@ -0,0 +1,49 @@
+import orjson
+import pytest
+from unittest.mock import patch, AsyncMock
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.api.v1.admin import get_stats, STATS_CACHE_KEY, STATS_CACHE_TTL_SECONDS
+from app.db.models import Base, User, Group, Message
+
+@pytest.fixture
+async def db():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_get_stats_counts_and_caches(db):
+    user = User(phone_number="+15551234567")
+    group = Group(participants=["+15551234567"])
+    db.add_all([user, group])
+    await db.flush()
+    db.add_all([
+        Message(group_id=group.id, sender_id=user.id, content="@jarvis plan", is_bot=False),
+        Message(group_id=group.id, sender_id=None, content="Sure", is_bot=True),
+        Message(group_id=group.id, sender_id=user.id, content="thanks", is_bot=False),
+    ])
+    await db.commit()
+
+    mock_redis = AsyncMock()
+    mock_redis.get.return_value = None
+    expected = {"users": 1, "groups": 1, "total_messages": 3, "jarvis_replies": 1}
+
+    with patch("app.api.v1.admin.redis_client", mock_redis):
+        # Miss: all four counts from a single query, then cached
+        with patch.object(db, "execute", wraps=db.execute) as mock_execute:
+            assert await get_stats(db) == expected
+            mock_execute.assert_called_once()
+        key, value = mock_redis.set.call_args.args
+        assert key == STATS_CACHE_KEY
+        assert orjson.loads(value) == expected
+        assert mock_redis.set.call_args.kwargs["ex"] == STATS_CACHE_TTL_SECONDS
+
+        # Hit: served from Redis without touching the database
+        mock_redis.get.return_value = value
+        with patch.object(db, "execute") as mock_execute:
+            assert await get_stats(db) == expected
+            mock_execute.assert_not_called()
@@ -1,11 +1,14 @@
+import asyncio
 import pytest
+import uuid
 from httpx import AsyncClient, ASGITransport
 from app.main import app
 from app.db.session import engine
-from app.db.models import Base
+from app.db.models import Base, Message
 from app.api.v1.endpoints import get_db_session, AsyncSessionLocal
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
@@ -36,11 +39,10 @@ async def setup_db():
 @pytest.fixture(autouse=True)
 def mock_redis():
     from unittest.mock import AsyncMock
-    with patch("redis.asyncio.from_url") as mock_redis_url:
-        mock_redis_instance = AsyncMock()
-        mock_redis_instance.incr.return_value = 1
-        mock_redis_url.return_value = mock_redis_instance
-        yield mock_redis_instance
+    from app.services.rate_limiter import rate_limiter
+    # RateLimiter runs its checks through a registered Lua script; allow both keys by default
+    with patch.object(rate_limiter, "_sliding_window", AsyncMock(return_value=[1, 1])) as mock_script:
+        yield mock_script
 
 @pytest.mark.asyncio
 async def test_webhook_flow(mock_redis):
@@ -48,7 +50,7 @@ async def test_webhook_flow(mock_redis):
     with patch("app.services.telnyx_service.telnyx_service.send_group_message") as mock_send_group, \
          patch("app.services.telnyx_service.telnyx_service.send_direct_message") as mock_send_direct, \
          patch("app.services.llm_service.llm_service.generate_response") as mock_llm, \
-         patch("app.api.v1.endpoints.process_inbound_message") as mock_process:
+         patch("app.api.v1.endpoints.inbound_batcher.submit") as mock_submit:
         
         mock_llm.return_value = "Hello from Jarvis"
         mock_send_group.return_value = {"status": "sent"}
@@ -73,6 +75,9 @@ async def test_webhook_flow(mock_redis):
             # But here we just check if mock was NOT called
             mock_send_group.assert_not_called()
 
+            # Queued for batched processing under the group's participants hash
+            mock_submit.assert_called_once()
+
             # 2. Test Summon
             payload_summon = {
                 "data": {
@@ -117,7 +122,7 @@ async def test_webhook_flow(mock_redis):
         }
         
         with patch("app.api.v1.endpoints.AsyncSessionLocal", return_value=TestSessionLocal()), \
-             patch("app.services.summarization_service.summarization_service.update_group_summary") as mock_summary:
+             patch("app.services.summarization_service.summarization_service.schedule_group_summary") as mock_summary:
              
              await process_inbound_message(payload_summon)
              
@@ -142,13 +147,19 @@ async def test_webhook_flow(mock_redis):
         mock_send_group.reset_mock()
         mock_send_direct.reset_mock()
         
-        with patch("app.api.v1.endpoints.AsyncSessionLocal", return_value=TestSessionLocal()):
+        async def fake_stream(system_prompt, user_prompt):
+            for delta in ["Hello from ", "Jarvis. Paste ", "this back."]:
+                yield delta
+
+        with patch("app.api.v1.endpoints.AsyncSessionLocal", return_value=TestSessionLocal()), \
+             patch("app.services.llm_service.llm_service.generate_stream", side_effect=fake_stream) as mock_stream:
              await process_inbound_message(payload_large)
              
-             # Should call LLM for fallback message
-             mock_llm.assert_called()
-             # Should call send_direct_message
-             mock_send_direct.assert_called()
+             # Should stream the LLM fallback message
+             mock_stream.assert_called_once()
+             # Should send it as DM segments, one per sentence
+             sent = [kwargs["text"] for _, kwargs in mock_send_direct.call_args_list]
+             assert sent == ["Hello from Jarvis.", "Paste this back."]
              # Should NOT call send_group_message
              mock_send_group.assert_not_called()
 
@@ -175,8 +186,8 @@ async def test_webhook_flow(mock_redis):
              assert "Jarvis Help" in kwargs.get("text", "")
 
         # Test Rate Limiting
-        # Simulate limit hit by making redis.incr return a large number
-        mock_redis.incr.return_value = 100
+        # Simulate limit hit by making the rate limit script deny both keys
+        mock_redis.return_value = [0, 0]
         
         payload_spam = {
             "data": {
@@ -197,4 +208,149 @@ async def test_webhook_flow(mock_redis):
              mock_send_group.assert_not_called()
              
         # Reset redis mock
-        mock_redis.incr.return_value = 1
+        mock_redis.return_value = [1, 1]
+
+@pytest.mark.asyncio
+async def test_sms_segments():
+    from app.api.v1.endpoints import sms_segments, SMS_SEGMENT_CHARS
+
+    async def deltas(*parts):
+        for part in parts:
+            yield part
+
+    segments = [seg async for seg in sms_segments(deltas("Sure! Let's ", "meet at 7. Any ", "preferences?"))]
+    assert segments == ["Sure!", "Let's meet at 7.", "Any preferences?"]
+
+    # A run-on sentence is cut at a word boundary within the segment limit
+    long_text = "word " * 60
+    segments = [seg async for seg in sms_segments(deltas(long_text))]
+    assert all(len(seg) <= SMS_SEGMENT_CHARS for seg in segments)
+    assert " ".join(segments) == long_text.strip()
+
+@pytest.mark.asyncio
+async def test_inbound_batch_replies_to_latest_summon(mock_redis):
+    from app.api.v1.endpoints import process_inbound_batch
+
+    def payload(sender, text):
+        return {
+            "data": {
+                "payload": {
+                    "from": {"phone_number": sender},
+                    "to": [{"phone_number": "+15559876543"}, {"phone_number": "+15557770000"}],
+                    "text": text
+                }
+            }
+        }
+
+    batch = [
+        payload("+15557770000", "@jarvis pizza?"),
+        payload("+15551234567", "sounds good"),
+        payload("+15551234567", "@jarvis actually tacos"),
+    ]
+
+    with patch("app.services.telnyx_service.telnyx_service.send_group_message") as mock_send_group, \
+         patch("app.services.llm_service.llm_service.generate_response") as mock_llm, \
+         patch("app.services.summarization_service.summarization_service.schedule_group_summary"), \
+         patch("app.api.v1.endpoints.AsyncSessionLocal", return_value=TestSessionLocal()):
+        mock_llm.return_value = "Tacos it is"
+
+        await process_inbound_batch(batch)
+
+        # One LLM call and one reply, for the latest summon only
+        mock_llm.assert_called_once()
+        assert "actually tacos" in mock_llm.call_args.args[1]
+        mock_send_group.assert_called_once()
+
+    async with TestSessionLocal() as db:
+        contents = set(await db.scalars(select(Message.content)))
+        assert {"@jarvis pizza?", "sounds good", "@jarvis actually tacos", "Tacos it is"} <= contents
+
+@pytest.mark.asyncio
+async def test_summarization_drain_waits_for_scheduled_jobs():
+    from app.services.summarization_service import summarization_service
+
+    with patch.object(summarization_service, "_group_summary_job") as mock_job:
+        async def slow_job(group_id, new_messages):
+            await asyncio.sleep(0.05)
+        mock_job.side_effect = slow_job
+
+        task = summarization_service.schedule_group_summary(uuid.uuid4(), ["a: hi"])
+        await summarization_service.drain()
+
+        assert task.done()
+        assert not summarization_service._tasks
+
+@pytest.mark.asyncio
+async def test_webhook_tolerates_missing_numbers():
+    with patch("app.api.v1.endpoints.inbound_batcher.submit") as mock_submit:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            # A recipient without a number is dropped from the participant set
+            response = await ac.post("/api/v1/webhook", json={
+                "data": {
+                    "event_type": "message.received",
+                    "payload": {
+                        "from": {"phone_number": "+15551234567"},
+                        "to": [{"phone_number": "+15559876543"}, {}],
+                        "text": "hi"
+                    }
+                }
+            })
+            assert response.status_code == 200
+            mock_submit.assert_called_once()
+
+            # No sender: acknowledged but not processed
+            mock_submit.reset_mock()
+            response = await ac.post("/api/v1/webhook", json={
+                "data": {
+                    "event_type": "message.received",
+                    "payload": {"to": [{"phone_number": "+15559876543"}], "text": "hi"}
+                }
+            })
+            assert response.status_code == 200
+            mock_submit.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_failed_summary_keeps_previous_summary():
+    from app.services.summarization_service import summarization_service
+
+    group = MagicMock(id=uuid.uuid4(), summary="Dinner Friday at 7")
+    db = MagicMock()
+    db.commit = AsyncMock()
+
+    with patch("app.services.summarization_service.llm_service.generate_summary", new_callable=AsyncMock) as mock_summary:
+        mock_summary.side_effect = RuntimeError("provider down")
+
+        with pytest.raises(RuntimeError):
+            await summarization_service.update_group_summary(db, group, ["a: hi"])
+
+        assert group.summary == "Dinner Friday at 7"
+        db.commit.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_failed_help_reply_does_not_drop_batch():
+    from app.api.v1.endpoints import process_inbound_batch
+    import httpx
+
+    def payload(text):
+        return {
+            "data": {
+                "payload": {
+                    "from": {"phone_number": "+15554443333"},
+                    "to": [{"phone_number": "+15559876543"}],
+                    "text": text
+                }
+            }
+        }
+
+    request = httpx.Request("POST", "https://api.telnyx.com/v2/messages")
+    error = httpx.HTTPStatusError("boom", request=request, response=httpx.Response(500, request=request))
+
+    with patch("app.services.telnyx_service.telnyx_service.send_direct_message", side_effect=error) as mock_send_dm, \
+         patch("app.api.v1.endpoints.AsyncSessionLocal", return_value=TestSessionLocal()):
+        await process_inbound_batch([payload("where are we meeting"), payload("HELP")])
+        mock_send_dm.assert_called_once()
+
+    async with TestSessionLocal() as db:
+        contents = set(await db.scalars(select(Message.content)))
+        assert "where are we meeting" in contents
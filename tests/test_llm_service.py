@@ -0,0 +1,157 @@
+import asyncio
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError
+from tenacity import wait_none
+from unittest.mock import patch, AsyncMock, MagicMock
+from app.services.llm_service import LLMService, llm_service
+
+def make_completion(content: str):
+    completion = MagicMock()
+    completion.choices = [MagicMock()]
+    completion.choices[0].message.content = content
+    return completion
+
+@pytest.mark.asyncio
+async def test_generate_response_cache():
+    mock_redis = AsyncMock()
+    mock_create = AsyncMock(return_value=make_completion(" Fresh answer "))
+
+    with patch.object(llm_service, "redis", mock_redis), \
+         patch.object(llm_service.client.chat.completions, "create", mock_create):
+
+        # Miss: calls OpenAI and stores the reply
+        mock_redis.get.return_value = None
+        assert await llm_service.generate_response("sys", "plan dinner") == "Fresh answer"
+        mock_create.assert_called_once()
+        key, value = mock_redis.set.call_args.args
+        assert key == llm_service.cache_key(llm_service.model, "sys", "plan dinner", 300, 0.7)
+        assert value == "Fresh answer"
+
+        # Hit: served from Redis without touching OpenAI
+        mock_create.reset_mock()
+        mock_redis.get.return_value = "Cached answer"
+        assert await llm_service.generate_response("sys", "plan dinner") == "Cached answer"
+        mock_create.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_generate_response_single_flight():
+    mock_redis = AsyncMock()
+    mock_redis.get.return_value = None
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_create(**kwargs):
+        started.set()
+        await release.wait()
+        return make_completion("Shared answer")
+
+    mock_create = AsyncMock(side_effect=slow_create)
+
+    with patch.object(llm_service, "redis", mock_redis), \
+         patch.object(llm_service.client.chat.completions, "create", mock_create):
+
+        callers = [asyncio.create_task(llm_service.generate_response("sys", "same prompt")) for _ in range(5)]
+        await started.wait()
+        release.set()
+        results = await asyncio.gather(*callers)
+
+        assert results == ["Shared answer"] * 5
+        mock_create.assert_called_once()
+        assert llm_service._inflight == {}
+
+@pytest.mark.asyncio
+async def test_generate_stream_caches_full_reply():
+    mock_redis = AsyncMock()
+    mock_redis.get.return_value = None
+
+    async def stream():
+        for delta in ["Hello", " there", None]:
+            chunk = MagicMock()
+            chunk.choices = [MagicMock()]
+            chunk.choices[0].delta.content = delta
+            yield chunk
+
+    mock_create = AsyncMock(return_value=stream())
+
+    with patch.object(llm_service, "redis", mock_redis), \
+         patch.object(llm_service.client.chat.completions, "create", mock_create):
+
+        deltas = [delta async for delta in llm_service.generate_stream("sys", "hi")]
+
+        assert deltas == ["Hello", " there"]
+        assert mock_create.call_args.kwargs["stream"] is True
+        key, value = mock_redis.set.call_args.args
+        assert key == llm_service.cache_key(llm_service.model, "sys", "hi", 300, 0.7)
+        assert value == "Hello there"
+
+@pytest.mark.asyncio
+async def test_generate_response_retries_transient_errors():
+    mock_redis = AsyncMock()
+    mock_redis.get.return_value = None
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    mock_create = AsyncMock(side_effect=[
+        APIConnectionError(request=request),
+        make_completion("Recovered"),
+    ])
+
+    with patch.object(llm_service, "redis", mock_redis), \
+         patch.object(llm_service.client.chat.completions, "create", mock_create), \
+         patch.object(LLMService._create_completion.retry, "wait", wait_none()):
+
+        assert await llm_service.generate_response("sys", "retry me") == "Recovered"
+        assert mock_create.call_count == 2
+
+@pytest.mark.asyncio
+async def test_generate_response_does_not_retry_permanent_errors():
+    mock_redis = AsyncMock()
+    mock_redis.get.return_value = None
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    mock_create = AsyncMock(side_effect=BadRequestError("bad", response=response, body=None))
+
+    with patch.object(llm_service, "redis", mock_redis), \
+         patch.object(llm_service.client.chat.completions, "create", mock_create):
+
+        assert await llm_service.generate_response("sys", "bad prompt") == "I'm having trouble thinking right now."
+        mock_create.assert_called_once()
+        mock_redis.set.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_generate_response_semantic_query_and_scope():
+    mock_redis = AsyncMock()
+    mock_redis.get.return_value = None
+    mock_semantic = MagicMock(enabled=True)
+    mock_semantic.embed = AsyncMock(return_value="embedding")
+    mock_semantic.lookup = AsyncMock(return_value=None)
+    mock_semantic.store = AsyncMock()
+    mock_create = AsyncMock(return_value=make_completion("Tacos"))
+
+    with patch.object(llm_service, "redis", mock_redis), \
+         patch.object(llm_service, "semantic_cache", mock_semantic), \
+         patch.object(llm_service.client.chat.completions, "create", mock_create):
+
+        await llm_service.generate_response(
+            "sys", "Context: likes tacos\n\nRequest: plan dinner",
+            semantic_query="plan dinner", semantic_scope="group-1\0likes tacos",
+        )
+
+        # Only the request is embedded; the context scopes the entry instead
+        mock_semantic.embed.assert_called_once_with("plan dinner")
+        scope = mock_semantic.lookup.call_args.args[0]
+        assert scope == "sys\0group-1\0likes tacos"
+        mock_semantic.store.assert_called_once_with(scope, "plan dinner", "embedding", "Tacos")
+
+@pytest.mark.asyncio
+async def test_generate_summary_raises_instead_of_fallback():
+    mock_redis = AsyncMock()
+    mock_redis.get.return_value = None
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    mock_create = AsyncMock(side_effect=BadRequestError("bad", response=response, body=None))
+
+    with patch.object(llm_service, "redis", mock_redis), \
+         patch.object(llm_service.client.chat.completions, "create", mock_create):
+
+        # The canned reply is for users; a summary must never be replaced by it
+        with pytest.raises(BadRequestError):
+            await llm_service.generate_summary("sys", "summarize me")
+        mock_redis.set.assert_not_called()
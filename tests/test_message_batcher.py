@@ -0,0 +1,24 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from app.services.message_batcher import MessageBatcher
+
+@pytest.mark.asyncio
+async def test_batches_events_per_key():
+    handler = AsyncMock()
+    batcher = MessageBatcher(handler, window_seconds=0.05)
+
+    await batcher.submit("group-a", {"n": 1})
+    await batcher.submit("group-b", {"n": 2})
+    await batcher.submit("group-a", {"n": 3})
+    handler.assert_not_called()
+
+    await batcher.drain()
+
+    batches = sorted((call.args[0] for call in handler.call_args_list), key=len, reverse=True)
+    assert batches == [[{"n": 1}, {"n": 3}], [{"n": 2}]]
+
+    # A new event after a flush starts a fresh batch
+    await batcher.submit("group-a", {"n": 4})
+    await asyncio.sleep(0.1)
+    assert handler.call_args.args[0] == [{"n": 4}]
@@ -0,0 +1,56 @@
+import fakeredis
+import pytest
+from unittest.mock import patch
+from app.services.rate_limiter import RateLimiter
+
+@pytest.fixture
+def limiter():
+    # Runs the real Lua script against an in-memory Redis
+    with patch("app.services.rate_limiter.redis_client", fakeredis.FakeAsyncRedis(decode_responses=True)):
+        limiter = RateLimiter()
+    with patch("app.services.rate_limiter.time.time") as clock:
+        limiter.clock = clock
+        yield limiter
+
+async def allowed_at(limiter, now, key="group:g", limit=2, window=100):
+    limiter.clock.return_value = now
+    return await limiter.is_allowed(key, limit, window)
+
+@pytest.mark.asyncio
+async def test_sliding_window(limiter):
+    assert await allowed_at(limiter, 0)
+    assert await allowed_at(limiter, 50)
+    assert not await allowed_at(limiter, 60)
+
+    # The request at t=0 has slid out of the window
+    assert await allowed_at(limiter, 101)
+    assert not await allowed_at(limiter, 120)
+
+@pytest.mark.asyncio
+async def test_rejected_requests_do_not_extend_lockout(limiter):
+    assert await allowed_at(limiter, 0)
+    assert await allowed_at(limiter, 10)
+
+    # Steady demand above the limit is rejected without being recorded...
+    for now in range(20, 100, 10):
+        assert not await allowed_at(limiter, now)
+
+    # ...so capacity comes back once the admitted requests age out
+    assert await allowed_at(limiter, 105)
+    assert await limiter.redis.zcard("rate_limit:group:g") == 2
+
+@pytest.mark.asyncio
+async def test_check_both_denied_user_spends_no_group_budget(limiter):
+    limiter.clock.return_value = 0
+    limiter.USER_LIMIT_PER_DAY = 1
+    limiter.GROUP_LIMIT_PER_HOUR = 2
+
+    assert await limiter.check_both("spammer", "g") == (True, True)
+    # Over the user limit: rejected, and the group's budget is left alone
+    for _ in range(5):
+        assert await limiter.check_both("spammer", "g") == (False, True)
+    assert await limiter.redis.zcard("rate_limit:group:g") == 1
+
+    # So the rest of the group can still summon
+    assert await limiter.check_both("friend", "g") == (True, True)
+    assert await limiter.check_both("other", "g") == (True, False)
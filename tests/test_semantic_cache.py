@@ -0,0 +1,116 @@
+import pytest
+import redis.asyncio as redis
+from unittest.mock import AsyncMock
+from app.services.semantic_cache import SemanticCache
+
+# Unit vectors, so inner product is cosine similarity
+VECTORS = {
+    "plan dinner": [1.0, 0.0],
+    "help plan dinner": [0.96, 0.28],
+    "book a flight": [0.0, 1.0],
+}
+
+class StubEncoder:
+    def encode(self, texts, normalize_embeddings=False):
+        return [VECTORS[text] for text in texts]
+
+class StubIndex:
+    """
+    Minimal stand-in for faiss.IndexFlatIP.
+    """
+    def __init__(self):
+        self.vectors = []
+
+    def add(self, embedding):
+        self.vectors.extend(embedding)
+
+    def search(self, embedding, k):
+        query = embedding[0]
+        scores = [sum(a * b for a, b in zip(query, vec)) for vec in self.vectors]
+        best = max(range(len(scores)), key=scores.__getitem__)
+        return [[scores[best]]], [[best]]
+
+    def reset(self):
+        self.vectors = []
+
+@pytest.fixture
+def cache():
+    cache = SemanticCache(AsyncMock())
+    cache.enabled = True
+    cache.model = StubEncoder()
+    cache.index_factory = StubIndex
+    cache.threshold = 0.92
+    cache.max_entries = 2
+    return cache
+
+async def remember(cache, scope, query, response):
+    await cache.store(scope, query, await cache.embed(query), response)
+
+@pytest.mark.asyncio
+async def test_lookup_hits_near_duplicates_only(cache):
+    await remember(cache, "scope", "plan dinner", "Tacos at 7?")
+    cache.redis.get.return_value = "Tacos at 7?"
+
+    # cos = 0.96, above the threshold
+    assert await cache.lookup("scope", await cache.embed("help plan dinner")) == "Tacos at 7?"
+    response_key = cache.redis.set.call_args.args[0]
+    cache.redis.get.assert_called_once_with(response_key)
+
+    # cos = 0, below the threshold
+    cache.redis.get.reset_mock()
+    assert await cache.lookup("scope", await cache.embed("book a flight")) is None
+    cache.redis.get.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_lookup_misses_other_scopes(cache):
+    await remember(cache, "group-a", "plan dinner", "Tacos at 7?")
+    cache.redis.get.return_value = "Tacos at 7?"
+
+    assert await cache.lookup("group-b", await cache.embed("plan dinner")) is None
+    cache.redis.get.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_store_resets_index_at_max_entries(cache):
+    await remember(cache, "scope", "plan dinner", "a")
+    await remember(cache, "scope", "book a flight", "b")
+    assert cache.size == 2
+
+    await remember(cache, "group-b", "help plan dinner", "c")
+    assert cache.size == 1
+    assert list(cache.scopes) == [cache._hash("group-b")]
+
+@pytest.mark.asyncio
+async def test_redis_failures_degrade_to_miss(cache):
+    # A failed write must not leave an index entry pointing at nothing
+    cache.redis.set.side_effect = redis.ConnectionError("down")
+    await remember(cache, "scope", "plan dinner", "a")
+    assert cache.scopes == {}
+
+    cache.redis.set.side_effect = None
+    await remember(cache, "scope", "plan dinner", "a")
+    cache.redis.get.side_effect = redis.ConnectionError("down")
+    assert await cache.lookup("scope", await cache.embed("plan dinner")) is None
+
+@pytest.mark.asyncio
+async def test_lookup_is_not_shadowed_by_other_scopes(cache):
+    # group-a's exact match is the closer one globally; group-b's own entry (cos 0.96) still counts
+    await remember(cache, "group-b", "help plan dinner", "Pizza?")
+    group_b_key = cache.redis.set.call_args.args[0]
+    await remember(cache, "group-a", "plan dinner", "Tacos at 7?")
+    cache.redis.get.return_value = "Pizza?"
+
+    assert await cache.lookup("group-b", await cache.embed("plan dinner")) == "Pizza?"
+    cache.redis.get.assert_called_once_with(group_b_key)
+
+@pytest.mark.asyncio
+async def test_lookup_drops_expired_entries(cache):
+    cache.max_entries = 10
+    await remember(cache, "scope", "plan dinner", "Tacos at 7?")
+    await remember(cache, "scope", "help plan dinner", "Pizza?")
+    fresh_key = cache.redis.set.call_args.args[0]
+
+    # The exact match expired in Redis; the next-best entry should still be found
+    cache.redis.get.side_effect = lambda key: "Pizza?" if key == fresh_key else None
+    assert await cache.lookup("scope", await cache.embed("plan dinner")) == "Pizza?"
+    assert cache.size == 1
+    assert cache.scopes[cache._hash("scope")][1][0][1] == fresh_key
@@ -0,0 +1,9 @@
+from app.services.summon_service import summon_service
+
+def test_is_summon():
+    assert summon_service.is_summon("@jarvis help us plan")
+    assert summon_service.is_summon("JARVIS: what time works?")
+    assert summon_service.is_summon("ok jarvis")
+    assert not summon_service.is_summon("Just chatting")
+    assert not summon_service.is_summon("ask jarvisbot later")
+    assert not summon_service.is_summon("")